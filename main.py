@@ -1,41 +1,125 @@
 import pandas as pd
-import gspread
+import numpy as np
 import requests
 import base64
 import json
 import os
+import re
+import threading
 from datetime import datetime, timedelta
-from pytz import timezone
-from google.oauth2.service_account import Credentials
+from zoneinfo import ZoneInfo
+from requests.adapters import HTTPAdapter, Retry
+
+try:
+    import orjson
+except ImportError:  # Opcional: sem ele cai no json da stdlib
+    orjson = None
 
 # --- CONFIGURAÇÕES FIXAS (Preservadas) ---
 SCOPES = ['https://www.googleapis.com/auth/spreadsheets', 'https://www.googleapis.com/auth/drive']
 NOME_ABA = 'Base Pending Tratado'
 INTERVALO = 'A:F'
+FORMATO_CPT = '%d/%m/%Y %H:%M:%S'
+_NAO_DIGITOS = re.compile(r'\D+')
+TURNOS = ['Turno 1', 'Turno 2', 'Turno 3']
+# Índice em TURNOS para cada hora do dia: 0h-5h Turno 3, 6h-13h Turno 1, 14h-21h Turno 2, 22h-23h Turno 3
+TURNO_POR_HORA = np.array([2] * 6 + [0] * 8 + [1] * 8 + [2] * 2, dtype=np.int8)
+COLUNAS_TEXTO = ('LH Trip Number', 'Station Name', 'Doca')
+TZ_SP = ZoneInfo('America/Sao_Paulo')
+SEPARADOR = "\n" + "—" * 45 + "\n"
+# Cliente gspread autenticado uma vez por processo (ver obter_cliente)
+_CLIENTE = None
+
+# Sessão única para o webhook: reaproveita a conexão TLS e refaz falhas de conexão
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=Retry(total=3, backoff_factor=0.3)))
+SESSION.headers.update({'Content-Type': 'application/json'})
+
+def aquecer_webhook(webhook):
+    # HEAD não publica nada: só resolve DNS e abre o TLS que o POST vai reaproveitar.
+    # Roda numa thread daemon que ninguém espera; se não terminar a tempo, o POST abre a própria conexão
+    try:
+        SESSION.head(webhook, timeout=2)
+    except requests.RequestException:
+        pass
+
+def ler_json(texto):
+    # Aceita str ou bytes; erros do orjson herdam de json.JSONDecodeError
+    if orjson: return orjson.loads(texto)
+    return json.loads(texto)
+
+def serializar(payload):
+    if orjson: return orjson.dumps(payload)
+    return json.dumps(payload).encode('utf-8')
 
 def autenticar_google():
     """Autenticação preservada conforme solicitado."""
     creds_var = os.environ.get('GOOGLE_SERVICE_ACCOUNT_JSON')
     if not creds_var: return None
     try:
+        # Import tardio: gspread/google-auth só carregam quando há credencial para usar
+        import gspread
+        from google.oauth2.service_account import Credentials
         try:
-            creds_dict = json.loads(creds_var)
+            creds_dict = ler_json(creds_var)
         except json.JSONDecodeError:
-            creds_dict = json.loads(base64.b64decode(creds_var).decode("utf-8"))
-        creds = Credentials.from_service_account_info(creds_dict, scopes=SCOPES)
-        return gspread.authorize(creds)
+            creds_dict = ler_json(base64.b64decode(creds_var))
+        return gspread.authorize(Credentials.from_service_account_info(creds_dict, scopes=SCOPES))
     except Exception:
         return None
 
-def formatar_doca(doca):
-    nums = ''.join(filter(str.isdigit, str(doca)))
-    return nums if nums else "--"
+def obter_cliente():
+    """Autentica uma vez por processo; chamadas seguintes reaproveitam o cliente."""
+    global _CLIENTE
+    if _CLIENTE is None:
+        _CLIENTE = autenticar_google()
+    return _CLIENTE
+
+def ler_colunas(cliente, sheet_id):
+    # Uma única chamada values.get: sem buscar antes os metadados da planilha e da aba
+    resposta = cliente.http_client.values_get(sheet_id, f"'{NOME_ABA}'!{INTERVALO}", params={
+        # Valores crus (datas como serial), já por coluna: o DataFrame sai direto, sem transpor
+        'majorDimension': 'COLUMNS',
+        'valueRenderOption': 'UNFORMATTED_VALUE',
+        'dateTimeRenderOption': 'SERIAL_NUMBER',
+    })
+    return resposta.get('values', [])
+
+def formatar_doca(docas):
+    # Poucas docas distintas: limpa só os valores únicos e espalha de volta
+    codigos, unicos = pd.factorize(docas)
+    # Só os dígitos de cada doca, numa passada vetorizada
+    nums = pd.Series(unicos, dtype='string').str.replace(_NAO_DIGITOS, '', regex=True)
+    return pd.Series(nums.array.take(codigos, allow_fill=True), index=docas.index).replace('', '--').fillna('--')
+
+def converter_cpt_texto(serie):
+    # CPTs se repetem muito: converte só os valores distintos e espalha de volta
+    codigos, unicos = pd.factorize(serie)
+    unicos = pd.Series(unicos)
+    # Formato fixo usa o parser vetorizado; só o que fugir do padrão cai na inferência
+    cpt = pd.to_datetime(unicos, format=FORMATO_CPT, errors='coerce')
+    falhas = cpt.isna()
+    if falhas.any():
+        cpt[falhas] = pd.to_datetime(unicos[falhas], dayfirst=True, errors='coerce')
+    return pd.Series(cpt.array.take(codigos, allow_fill=True), index=serie.index)
+
+def converter_cpt(serie):
+    # Células de data chegam como serial do Sheets (dias desde 30/12/1899): conversão numérica direta
+    seriais = pd.to_numeric(serie, errors='coerce')
+    cpt = pd.to_datetime(seriais, unit='D', origin='1899-12-30').dt.round('s')
+    # O que vier como texto segue pelo parser de strings
+    texto = cpt.isna() & serie.notna()
+    if texto.any():
+        cpt = cpt.mask(texto, converter_cpt_texto(serie[texto]))
+    return cpt
 
 def montar_mensagem(df):
-    agora = datetime.now(timezone('America/Sao_Paulo')).replace(tzinfo=None)
+    agora = datetime.now(TZ_SP).replace(tzinfo=None)
     limite_2h = agora + timedelta(hours=2)
     
-    df_2h = df[(df['CPT'] >= agora) & (df['CPT'] < limite_2h)].copy()
+    # df chega ordenado por CPT: a janela é uma fatia achada por busca binária
+    janela = np.searchsorted(df['CPT'].to_numpy(), np.array([agora, limite_2h], dtype='datetime64[us]'))
+    df_2h = df.iloc[janela[0]:janela[1]]
     
     # Início do Bloco Único
     saida = ["```"]
@@ -44,44 +128,45 @@ def montar_mensagem(df):
     if df_2h.empty:
         saida.append("✅ Sem pendências para as próximas 2h.")
     else:
-        df_2h = df_2h.sort_values('CPT')
-        df_2h['H_Grupo'] = df_2h['CPT'].dt.hour
+        horas = df_2h['CPT'].dt.hour.to_numpy()
         
         # Larguras ajustadas: Doca mais estreita e CPT para centralização
         w_lt = 14
         w_doca = 5  # Reduzido de 8 para 5
         w_cpt = 7   # Largura para centralizar o texto "CPT:" e a hora
         
-        for hora, grupo in df_2h.groupby('H_Grupo', sort=False):
-            qtd = len(grupo)
+        # Linha com Doca estreita e CPT centralizado; larguras fixadas uma vez no molde
+        formatar_linha = f"{{:<{w_lt}}} | {{:^{w_doca}}} | {{:^{w_cpt}}} | {{}}".format
+        # Linhas montadas de uma vez para todo o recorte, a partir dos arrays NumPy das colunas
+        linhas = list(map(
+            formatar_linha,
+            df_2h['LH Trip Number'].to_numpy(),
+            formatar_doca(df_2h['Doca']).to_numpy(),
+            df_2h['CPT'].dt.strftime('%H:%M').to_numpy(),
+            df_2h['Station Name'].to_numpy(),
+        ))
+        
+        # Cabeçalho: CPT: centralizado (igual para todos os blocos)
+        sub_header = f"{'LT':^{w_lt}} | {'Doca':^{w_doca}} | {'CPT':^{w_cpt}} | Destino"
+        
+        # Recorte ordenado por CPT: cada hora é um bloco contíguo (inclusive na virada do dia)
+        limites = np.r_[0, np.flatnonzero(np.diff(horas)) + 1, len(horas)]
+        for inicio, fim in zip(limites[:-1], limites[1:]):
+            hora = horas[inicio]
+            qtd = fim - inicio
             saida.append(f"{qtd} LH{'s' if qtd > 1 else ''} pendente{'s' if qtd > 1 else ''} às {hora:02d}h\n")
-            
-            # Cabeçalho: CPT: centralizado
-            sub_header = f"{'LT':^{w_lt}} | {'Doca':^{w_doca}} | {'CPT':^{w_cpt}} | Destino"
             saida.append(sub_header)
             
-            for _, row in grupo.iterrows():
-                lt = row['LH Trip Number'].strip()
-                doca = formatar_doca(row['Doca'])
-                cpt = row['CPT'].strftime('%H:%M')
-                destino = row['Station Name'].strip()
-                
-                # Linha com Doca estreita e CPT centralizado
-                linha = f"{lt:<{w_lt}} | {doca:^{w_doca}} | {cpt:^{w_cpt}} | {destino}"
-                saida.append(linha)
+            saida.extend(linhas[inicio:fim])
             
-            saida.append("\n" + "—"*45 + "\n")
+            saida.append(SEPARADOR)
 
     # Rodapé de Turnos
     saida.append("LH´s pendentes para os próximos turnos:\n")
     
-    def get_turno_atual(h):
-        if 6 <= h < 14: return "Turno 1"
-        if 14 <= h < 22: return "Turno 2"
-        return "Turno 3"
-    
-    turno_atual = get_turno_atual(agora.hour)
-    totais = df['Turno'].value_counts().to_dict()
+    turno_atual = TURNOS[TURNO_POR_HORA[agora.hour]]
+    # Turno é categórico sobre TURNOS: conta os códigos int8, sem hashear rótulos
+    totais = dict(zip(TURNOS, np.bincount(df['Turno'].cat.codes, minlength=len(TURNOS))))
     
     ordem_resumo = {
         'Turno 1': ['Turno 2', 'Turno 3'],
@@ -99,29 +184,42 @@ def montar_mensagem(df):
 def main():
     webhook = os.environ.get('SEATALK_WEBHOOK_URL')
     sheet_id = os.environ.get('SPREADSHEET_ID')
+    if not webhook or not sheet_id:
+        print("Erro: SEATALK_WEBHOOK_URL e SPREADSHEET_ID precisam estar definidos")
+        return
     
-    cliente = autenticar_google()
-    if not cliente: return
-
     try:
-        planilha = cliente.open_by_key(sheet_id)
-        dados = planilha.worksheet(NOME_ABA).get(INTERVALO)
-        
-        df_raw = pd.DataFrame(dados)
-        df = df_raw[1:].copy()
-        df.columns = df_raw.iloc[0].str.strip()
+        # Conexão com o webhook sobe em paralelo à leitura da planilha, sem ninguém esperar por ela
+        threading.Thread(target=aquecer_webhook, args=(webhook,), daemon=True).start()
+        cliente = obter_cliente()
+        if cliente is None: return
+        colunas = ler_colunas(cliente, sheet_id)
+        # A API corta células vazias no fim de cada coluna: completa até a maior
+        n = max(len(col) for col in colunas) - 1
+        base = {}
+        for col in colunas:
+            if not col: continue
+            nome = str(col[0]).strip()
+            valores = col[1:] + [None] * (n - len(col) + 1)
+            # Colunas de texto já nascem como 'string', sem passar por object
+            base[nome] = pd.array(valores, dtype='string') if nome in COLUNAS_TEXTO else valores
+        df = pd.DataFrame(base)
+        # Espaços removidos uma vez aqui; daqui em diante nada mais chama strip
+        for col in COLUNAS_TEXTO:
+            df[col] = df[col].str.strip()
+        # Poucas estações distintas: categoria guarda só códigos + dicionário
+        df['Station Name'] = df['Station Name'].astype('category')
         
-        df['CPT'] = pd.to_datetime(df['CPT'], dayfirst=True, errors='coerce')
-        df = df.dropna(subset=['CPT'])
+        df['CPT'] = converter_cpt(df['CPT'])
+        # Ordena uma vez na carga (estável: empates mantêm a ordem da planilha)
+        df = df.dropna(subset=['CPT']).sort_values('CPT', kind='stable', ignore_index=True)
         
-        def get_turno(h):
-            if 6 <= h < 14: return "Turno 1"
-            if 14 <= h < 22: return "Turno 2"
-            return "Turno 3"
-        df['Turno'] = df['CPT'].dt.hour.apply(get_turno)
+        codigos = TURNO_POR_HORA[df['CPT'].dt.hour.to_numpy()]
+        df['Turno'] = pd.Categorical.from_codes(codigos, categories=TURNOS)
         
         mensagem = montar_mensagem(df)
-        requests.post(webhook, json={"tag": "text", "text": {"content": mensagem}})
+        corpo = serializar({"tag": "text", "text": {"content": mensagem}})
+        SESSION.post(webhook, data=corpo, timeout=10)
         print("✅ Mensagem enviada com novos ajustes de coluna!")
         
     except Exception as e: